@@ -15,7 +15,9 @@ from litepcie.common import *
 # AD9361 Helpers -----------------------------------------------------------------------------------
 
 def _sign_extend(data, nbits=16):
-    return Cat(data, Replicate(data[-1], nbits - len(data)))
+    # Reuse a single MSB slice node for all the extension bits.
+    msb = data[-1]
+    return Cat(data, *([msb]*(nbits - len(data))))
 
 # AD9361 TX BitMode --------------------------------------------------------------------------------
 
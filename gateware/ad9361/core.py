@@ -4,10 +4,13 @@
 # Copyright (c) 2024 Enjoy-Digital <enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+from functools import reduce
+from operator import or_
+
 from migen import *
+from migen.genlib.cdc import MultiReg
 
 from litex.gen import *
-from litex.gen.genlib.misc import WaitTimer
 
 from litex.soc.interconnect import stream
 from litex.soc.interconnect.csr import *
@@ -17,7 +20,6 @@ from litepcie.common import *
 from gateware.ad9361.phy     import AD9361PHY
 from gateware.ad9361.spi     import AD9361SPIMaster
 from gateware.ad9361.bitmode import AD9361TXBitMode, AD9361RXBitMode
-from gateware.ad9361.bitmode import _sign_extend
 
 # Architecture -------------------------------------------------------------------------------------
 #
@@ -78,7 +80,9 @@ from gateware.ad9361.bitmode import _sign_extend
 # AD9361 RFIC --------------------------------------------------------------------------------------
 
 class AD9361RFIC(LiteXModule):
-    def __init__(self, rfic_pads, spi_pads, sys_clk_freq):
+    def __init__(self, rfic_pads, spi_pads, sys_clk_freq, with_buffer=True, cdc_data_width=64, cdc_depth=16, with_idelay=False):
+        assert cdc_data_width in [32, 64]
+
         # Controls ---------------------------------------------------------------------------------
         self.enable_datapath = Signal(reset=1)
 
@@ -133,36 +137,62 @@ class AD9361RFIC(LiteXModule):
         self.spi = AD9361SPIMaster(spi_pads, data_width=24, clk_divider=8)
 
         # Config / Status --------------------------------------------------------------------------
-        self.sync += [
+        # CSRs are already registered: drive the control pins directly.
+        self.comb += [
             rfic_pads.rst_n.eq(self._config.fields.rst_n),
             rfic_pads.enable.eq(self._config.fields.enable),
             rfic_pads.txnrx.eq(self._config.fields.txnrx),
             rfic_pads.en_agc.eq(self._config.fields.en_agc),
 
             rfic_pads.ctrl.eq(self._ctrl.storage),
-            self._stat.fields.stat.eq(rfic_pads.stat)
         ]
+        # Status pins are asynchronous: resynchronize them.
+        self.specials += MultiReg(rfic_pads.stat, self._stat.fields.stat)
 
         # PHY --------------------------------------------------------------------------------------
-        self.phy = AD9361PHY(rfic_pads)
+        self.phy = AD9361PHY(rfic_pads, with_idelay=with_idelay)
 
         # Cross domain crossing --------------------------------------------------------------------
+        # The CDC can be narrowed to 32-bit (with 2:1 converters on each side) to halve the async
+        # FIFOs storage. The sys-side bandwidth (sys_clk_freq * cdc_data_width) must then still
+        # cover the sample rate: only use it when not oversampling. The async FIFOs depth absorbs the
+        # PCIe DMA burst jitter on the sys side.
         self.tx_cdc = tx_cdc = stream.ClockDomainCrossing(
-            layout  = dma_layout(64),
+            layout  = dma_layout(cdc_data_width),
             cd_from = "sys",
             cd_to   = "rfic",
+            depth   = cdc_depth,
             with_common_rst = True
         )
         self.rx_cdc = rx_cdc = stream.ClockDomainCrossing(
-            layout  = dma_layout(64),
+            layout  = dma_layout(cdc_data_width),
             cd_from = "rfic",
             cd_to   = "sys",
+            depth   = cdc_depth,
             with_common_rst = True
         )
+        tx_cdc_pipeline = [tx_cdc]
+        rx_cdc_pipeline = [rx_cdc]
+        if cdc_data_width != 64:
+            self.tx_cdc_down = stream.Converter(64, cdc_data_width)
+            self.tx_cdc_up   = ClockDomainsRenamer("rfic")(stream.Converter(cdc_data_width, 64))
+            self.rx_cdc_down = ClockDomainsRenamer("rfic")(stream.Converter(64, cdc_data_width))
+            self.rx_cdc_up   = stream.Converter(cdc_data_width, 64)
+            tx_cdc_pipeline = [self.tx_cdc_down, tx_cdc, self.tx_cdc_up]
+            rx_cdc_pipeline = [self.rx_cdc_down, rx_cdc, self.rx_cdc_up]
+        tx_rfic_source = tx_cdc_pipeline[-1].source
+        rx_rfic_sink   = rx_cdc_pipeline[0].sink
 
-        # Buffers (For Timings) --------------------------------------------------------------------
-        self.tx_buffer = tx_buffer = stream.Buffer(dma_layout(64))
-        self.rx_buffer = rx_buffer = stream.Buffer(dma_layout(64))
+        # Buffers (Optional, For Timings) ----------------------------------------------------------
+        # The CDC's async FIFO and the DMA already register their ports: the buffers can be omitted
+        # when timings are met without them.
+        tx_buffers = []
+        rx_buffers = []
+        if with_buffer:
+            self.tx_buffer = tx_buffer = stream.Buffer(dma_layout(64))
+            self.rx_buffer = rx_buffer = stream.Buffer(dma_layout(64))
+            tx_buffers = [tx_buffer]
+            rx_buffers = [rx_buffer]
 
         # BitMode ----------------------------------------------------------------------------------
         self.tx_bitmode = tx_bitmode = AD9361TXBitMode()
@@ -176,35 +206,26 @@ class AD9361RFIC(LiteXModule):
         # ---
         self.tx_pipeline = stream.Pipeline(
             self.sink,
-            tx_buffer,
             tx_bitmode,
-            tx_cdc,
+            *tx_buffers,
+            *tx_cdc_pipeline,
         )
-        self.comb += [
-            tx_cdc.source.connect(self.phy.sink, keep={"valid", "ready"}),
-            self.phy.sink.ia.eq(tx_cdc.source.data[0*16:1*16]),
-            self.phy.sink.qa.eq(tx_cdc.source.data[1*16:2*16]),
-            self.phy.sink.ib.eq(tx_cdc.source.data[2*16:3*16]),
-            self.phy.sink.qa.eq(tx_cdc.source.data[3*16:4*16]),
-        ]
+        self.comb += tx_rfic_source.connect(self.phy.sink, keep={"valid", "ready", "data"})
 
         # RX.
         # ---
-        self.comb += [
-            self.phy.source.connect(rx_cdc.sink, keep={"valid", "ready"}),
-            rx_cdc.sink.data[0*16:1*16].eq(_sign_extend(self.phy.source.ia, 16)),
-            rx_cdc.sink.data[1*16:2*16].eq(_sign_extend(self.phy.source.qa, 16)),
-            rx_cdc.sink.data[2*16:3*16].eq(_sign_extend(self.phy.source.ib, 16)),
-            rx_cdc.sink.data[3*16:4*16].eq(_sign_extend(self.phy.source.qb, 16)),
-        ]
+        self.comb += self.phy.source.connect(rx_rfic_sink, keep={"valid", "ready", "data"})
         self.rx_pipeline = stream.Pipeline(
-            rx_cdc,
+            *rx_cdc_pipeline,
             rx_bitmode,
-            rx_buffer,
+            *rx_buffers,
             self.source
         )
 
     def add_prbs(self):
+        # PRBS TX/RX can only be added once (CSRs/PHY overrides would otherwise be duplicated).
+        if hasattr(self, "prbs_tx"):
+            return
         from gateware.ad9361.prbs import AD9361PRBSGenerator, AD9361PRBSChecker
         self.prbs_tx = CSRStorage(fields=[
             CSRField("enable", size=1, offset= 0, values=[
@@ -222,24 +243,39 @@ class AD9361RFIC(LiteXModule):
         phy = self.phy
 
         # PRBS TX.
+        prbs_enable = Signal()
+        self.specials += MultiReg(self.prbs_tx.fields.enable, prbs_enable, "rfic")
         prbs_generator = AD9361PRBSGenerator()
         prbs_generator = ResetInserter()(prbs_generator)
         prbs_generator = ClockDomainsRenamer("rfic")(prbs_generator)
-        self.comb += prbs_generator.reset.eq(~self.prbs_tx.fields.enable)
+        self.comb += prbs_generator.reset.eq(~prbs_enable)
         self.submodules += prbs_generator
         self.comb += prbs_generator.ce.eq(phy.sink.ready)
-        self.comb += If(self.prbs_tx.fields.enable,
+        self.comb += If(prbs_enable,
             phy.sink.valid.eq(1),
             phy.sink.ia.eq(prbs_generator.o),
             phy.sink.ib.eq(prbs_generator.o),
         )
 
         # PRBS RX.
-        self.comb += self.prbs_rx.fields.synced.eq(1)
+        # Both lanes carry the same PRBS sequence: share one reference generator between checkers.
+        prbs_reference = AD9361PRBSGenerator()
+        prbs_reference = ResetInserter()(prbs_reference)
+        prbs_reference = ClockDomainsRenamer("rfic")(prbs_reference)
+        self.submodules += prbs_reference
+        self.comb += prbs_reference.ce.eq(phy.source.valid)
+        prbs_errors = []
+        self.prbs_synced = prbs_synced = Signal() # o (rfic).
+        self.comb += prbs_synced.eq(1)
         for data in [phy.source.ia, phy.source.ib]:
-            prbs_checker = AD9361PRBSChecker()
+            prbs_checker = AD9361PRBSChecker(ref=prbs_reference.o)
             prbs_checker = ClockDomainsRenamer("rfic")(prbs_checker)
             self.submodules += prbs_checker
             self.comb += prbs_checker.i.eq(data)
             self.comb += prbs_checker.ce.eq(phy.source.valid)
-            self.comb += If(~prbs_checker.synced, self.prbs_rx.fields.synced.eq(0))
+            self.comb += If(~prbs_checker.synced, prbs_synced.eq(0))
+            prbs_errors.append(prbs_checker.error)
+        # PRBS reference re-synchronization.
+        self.comb += prbs_reference.reset.eq(reduce(or_, prbs_errors))
+        # PRBS synced status (rfic -> sys).
+        self.specials += MultiReg(prbs_synced, self.prbs_rx.fields.synced)
@@ -4,7 +4,10 @@
 # Copyright (c) 2024 Enjoy-Digital <enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+from enum import IntEnum
+
 from migen import *
+from migen.genlib.cdc       import MultiReg
 from migen.genlib.resetsync import AsyncResetSynchronizer
 
 from litex.gen import *
@@ -12,21 +15,34 @@ from litex.gen import *
 from litex.soc.interconnect.csr import *
 from litex.soc.interconnect import stream
 
+from gateware.ad9361.bitmode import _sign_extend
+
 # Constants ----------------------------------------------------------------------------------------
 
+class Modes(IntEnum):
+    M2R2T = 0
+    M1R1T = 1
+
 modes = {
-    "2R2T": 0,
-    "1R1T": 1,
+    "2R2T": Modes.M2R2T,
+    "1R1T": Modes.M1R1T,
 }
 
+# Samples are packed as 4 x 16-bit lanes (IA, QA, IB, QB), 12-bit samples sign-extended to 16-bit.
+iq_lanes = ["ia", "qa", "ib", "qb"]
+
 def phy_layout():
-    layout = [
-        ("ia", 12),
-        ("qa", 12),
-        ("ib", 12),
-        ("qb", 12)]
+    layout = [("data", 64)]
     return stream.EndpointDescription(layout)
 
+def pack_iq(ia, qa, ib, qb):
+    return Cat(*[_sign_extend(sample, 16) for sample in [ia, qa, ib, qb]])
+
+def add_iq_views(endpoint):
+    # Per-lane 12-bit views of the packed data (no extra hardware).
+    for n, name in enumerate(iq_lanes):
+        setattr(endpoint, name, endpoint.data[16*n:16*n + 12])
+
 # AD9361PHY ----------------------------------------------------------------------------------------
 
 class AD9361PHY(LiteXModule):
@@ -38,13 +54,21 @@ class AD9361PHY(LiteXModule):
     - In 1R1T mode, the 'a' suffix is used for the first sample, and 'b' for the second sample.
     - In 2R2T mode, the 'a' suffix is used for channel 1 samples, and 'b' for channel 2 samples.
 
+    Samples are streamed as a single 64-bit word of 4 x 16-bit lanes (see `pack_iq`); 12-bit
+    `ia`/`qa`/`ib`/`qb` views are also provided on the sink/source endpoints.
+
     The operating mode can be selected through the `mode` register. Additionally, a dynamic loopback
     feature is supported, which can be enabled or disabled through the `loopback` register.
+
+    Optionally (with_idelay), IDELAYE2s are inserted on the RX frame/data inputs to allow RX timing
+    training from the FPGA side through the `idelay` register (requires an IDELAYCTRL @ 200MHz).
     """
 
-    def __init__(self, pads):
+    def __init__(self, pads, with_idelay=False):
         self.sink    = sink   = stream.Endpoint(phy_layout())
         self.source  = source = stream.Endpoint(phy_layout())
+        add_iq_views(sink)
+        add_iq_views(source)
         self.control = CSRStorage(fields=[
             CSRField("mode", size=1, offset=0, values=[
                 ("``0b0``", "2R2T mode."),
@@ -55,18 +79,71 @@ class AD9361PHY(LiteXModule):
                 ("``0b1``", "Loopback enabled."),
             ]),
         ])
+        if with_idelay:
+            self.idelay = CSRStorage(fields=[
+                CSRField("rst", size=1, offset=0, pulse=True, description="Reset RX delays to 0."),
+                CSRField("inc", size=1, offset=1, pulse=True, description="Increment RX delays (78ps taps)."),
+            ])
 
         # # #
 
         # Signals.
         # --------
-        mode     = self.control.fields.mode     # FIXME: Add MultiReg.
-        loopback = self.control.fields.loopback # FIXME: Add MultiReg.
+        mode     = Signal()
+        loopback = Signal()
+        self.specials += [
+            MultiReg(self.control.fields.mode,     mode,     "rfic"),
+            MultiReg(self.control.fields.loopback, loopback, "rfic"),
+        ]
+
+        # Clocks.
+        rfic_clk = ClockSignal("rfic")
+
+        # IDDR/ODDR common parameters.
+        iddr_common = dict(
+            p_DDR_CLK_EDGE = "SAME_EDGE_PIPELINED",
+            i_C  = rfic_clk,
+            i_CE = 1,
+            i_S  = 0,
+            i_R  = 0,
+        )
+        oddr_common = dict(
+            p_DDR_CLK_EDGE = "SAME_EDGE",
+            i_C  = rfic_clk,
+            i_CE = 1,
+            i_S  = 0,
+            i_R  = 0,
+        )
 
         # RX ---------------------------------------------------------------------------------------
         # Due to use of IDDR, AD9361 needs to be configured with a delay of ~4ns on data.
         # With 122.8MHz clk, it means a rx_data_delay of 13 (0.3ns LSB)
 
+        # Delays.
+        # -------
+        def rx_idelay(i):
+            if not with_idelay:
+                return i
+            o = Signal()
+            self.specials += Instance("IDELAYE2",
+                p_IDELAY_TYPE           = "VARIABLE",
+                p_IDELAY_VALUE          = 0,
+                p_REFCLK_FREQUENCY      = 200.0,
+                p_DELAY_SRC             = "IDATAIN",
+                p_HIGH_PERFORMANCE_MODE = "TRUE",
+                p_CINVCTRL_SEL          = "FALSE",
+                p_PIPE_SEL              = "FALSE",
+                p_SIGNAL_PATTERN        = "DATA",
+                i_C        = ClockSignal("sys"),
+                i_LD       = self.idelay.fields.rst,
+                i_CE       = self.idelay.fields.inc,
+                i_LDPIPEEN = 0,
+                i_INC      = 1,
+                i_IDATAIN  = i,
+                o_DATAOUT  = o,
+            )
+            return o
+
         # Clocking.
         # ---------
         rx_clk_ibufds = Signal()
@@ -78,7 +155,7 @@ class AD9361PHY(LiteXModule):
             ),
             Instance("BUFG",
                 i_I = rx_clk_ibufds,
-                o_O = ClockSignal("rfic")
+                o_O = rfic_clk
             ),
             AsyncResetSynchronizer(ClockDomain("rfic"), ResetSignal("sys")),
         ]
@@ -96,13 +173,8 @@ class AD9361PHY(LiteXModule):
                 i_IB = pads.rx_frame_n,
                 o_O  = rx_frame_ibufds
             ),
-            Instance("IDDR",
-                p_DDR_CLK_EDGE = "SAME_EDGE_PIPELINED",
-                i_C  = ClockSignal("rfic"),
-                i_CE = 1,
-                i_S  = 0,
-                i_R  = 0,
-                i_D  = rx_frame_ibufds,
+            Instance("IDDR", **iddr_common,
+                i_D  = rx_idelay(rx_frame_ibufds),
                 o_Q1 = rx_frame,
                 o_Q2 = Open(),
             )
@@ -118,70 +190,66 @@ class AD9361PHY(LiteXModule):
         rx_data_ibufds = Signal(6)
         rx_data_half_i = Signal(6)
         rx_data_half_q = Signal(6)
-        for i in range(6):
-            self.specials += [
-                Instance("IBUFDS",
-                    i_I  = pads.rx_data_p[i],
-                    i_IB = pads.rx_data_n[i],
-                    o_O  = rx_data_ibufds[i]
-                ),
-                Instance("IDDR",
-                    p_DDR_CLK_EDGE = "SAME_EDGE_PIPELINED",
-                    i_C  = ClockSignal("rfic"),
-                    i_CE = 1,
-                    i_S  = 0,
-                    i_R  = 0,
-                    i_D  = rx_data_ibufds[i],
-                    o_Q1 = rx_data_half_i[i],
-                    o_Q2 = rx_data_half_q[i],
-                )
-            ]
+        self.specials += [
+            Instance("IBUFDS",
+                i_I  = pads.rx_data_p[i],
+                i_IB = pads.rx_data_n[i],
+                o_O  = rx_data_ibufds[i]
+            ) for i in range(6)
+        ]
+        rx_data_idelay = [rx_idelay(rx_data_ibufds[i]) for i in range(6)]
+        self.specials += [
+            Instance("IDDR", **iddr_common,
+                i_D  = rx_data_idelay[i],
+                o_Q1 = rx_data_half_i[i],
+                o_Q2 = rx_data_half_q[i],
+            ) for i in range(6)
+        ]
 
         # rx_frame = 1 / IA/QA.
         # rx_frame = 0 / IB/QB.
         rx_frame_first = Signal()
-        rx_data_valid  = Signal(4)
+        rx_data_valid  = Signal(5)
         rx_data_ia     = Signal(12)
         rx_data_qa     = Signal(12)
         rx_data_ib     = Signal(12)
         rx_data_qb     = Signal(12)
         self.sync.rfic += [
-            If(mode == modes["1R1T"],
-                rx_data_valid.eq(Cat(rx_frame_rising & rx_frame_first, rx_data_valid[0:3])),
-                If(rx_frame_rising_d, rx_frame_first.eq(~rx_frame_first))
-            ).Elif(mode == modes["2R2T"],
-                rx_data_valid.eq(Cat(rx_frame_rising, rx_data_valid[0:3]))
-            )
+            rx_data_valid.eq(Cat(rx_frame_rising & Mux(mode == Modes.M1R1T, rx_frame_first, 1), rx_data_valid[0:4])),
+            If((mode == Modes.M1R1T) & rx_frame_rising_d, rx_frame_first.eq(~rx_frame_first))
         ]
+
+        # Retiming: Register half-words and frame tags, assemble samples one cycle later (valid
+        # shift-register is one stage longer to compensate).
+        rx_data_half_i_r = Signal(6)
+        rx_data_half_q_r = Signal(6)
+        rx_frame_r       = Signal()
+        rx_frame_first_r = Signal()
         self.sync.rfic += [
-            If(mode == modes["1R1T"],
-                If(rx_frame_first,
-                    rx_data_ia.eq(Cat(rx_data_half_i, rx_data_ia[:6])),
-                    rx_data_qa.eq(Cat(rx_data_half_q, rx_data_qa[:6])),
-                ).Else(
-                    rx_data_ib.eq(Cat(rx_data_half_i, rx_data_ib[:6])),
-                    rx_data_qb.eq(Cat(rx_data_half_q, rx_data_qb[:6])),
-                )
-            ).Elif(mode == modes["2R2T"],
-                If(rx_frame,
-                    rx_data_ia.eq(Cat(rx_data_half_i, rx_data_ia[:6])),
-                    rx_data_qa.eq(Cat(rx_data_half_q, rx_data_qa[:6])),
-                ).Else(
-                    rx_data_ib.eq(Cat(rx_data_half_i, rx_data_ib[:6])),
-                    rx_data_qb.eq(Cat(rx_data_half_q, rx_data_qb[:6])),
-                )
+            rx_data_half_i_r.eq(rx_data_half_i),
+            rx_data_half_q_r.eq(rx_data_half_q),
+            rx_frame_r.eq(rx_frame),
+            rx_frame_first_r.eq(rx_frame_first),
+        ]
+        # Channel A selection: 1R1T: first/second sample, 2R2T: rx_frame high/low.
+        rx_use_a = Signal()
+        self.comb += rx_use_a.eq(Mux(mode == Modes.M1R1T, rx_frame_first_r, rx_frame_r))
+        self.sync.rfic += [
+            If(rx_use_a,
+                rx_data_ia.eq(Cat(rx_data_half_i_r, rx_data_ia[:6])),
+                rx_data_qa.eq(Cat(rx_data_half_q_r, rx_data_qa[:6])),
+            ).Else(
+                rx_data_ib.eq(Cat(rx_data_half_i_r, rx_data_ib[:6])),
+                rx_data_qb.eq(Cat(rx_data_half_q_r, rx_data_qb[:6])),
             )
         ]
 
         # Drive Source
         self.sync.rfic += [
             source.valid.eq(0),
-            If(rx_data_valid[3],
+            If(rx_data_valid[4],
                 source.valid.eq(1),
-                source.ia.eq(rx_data_ia),
-                source.qa.eq(rx_data_qa),
-                source.ib.eq(rx_data_ib),
-                source.qb.eq(rx_data_qb)
+                source.data.eq(pack_iq(rx_data_ia, rx_data_qa, rx_data_ib, rx_data_qb)),
             )
         ]
 
@@ -195,28 +263,27 @@ class AD9361PHY(LiteXModule):
         self.sync.rfic += tx_cnt.eq(tx_cnt + 1)
         self.comb += tx_ce.eq(tx_cnt == 3)
 
+        # Half-words are sent MSB first: IA/QA[11:6], IA/QA[5:0], IB/QB[11:6], IB/QB[5:0]. Samples
+        # are loaded on tx_ce into 24-bit shift registers and shifted 6-bit each rfic cycle, the
+        # output half-word being the top 6-bit.
         tx_data_valid = Signal()
-        tx_data_ia    = Signal(12)
-        tx_data_qa    = Signal(12)
-        tx_data_ib    = Signal(12)
-        tx_data_qb    = Signal(12)
+        tx_shift_i    = Signal(24)
+        tx_shift_q    = Signal(24)
         self.sync.rfic += [
+            # Set on first tx_ce after reset: TX framing then runs continuously (zeroes on underrun).
             If(tx_ce,
                 tx_data_valid.eq(1)
-            ).Elif(tx_ce,
-                tx_data_valid.eq(0)
             ),
             If(tx_ce,
-                tx_data_ia.eq(0),
-                tx_data_qa.eq(0),
-                tx_data_ib.eq(0),
-                tx_data_qb.eq(0),
+                tx_shift_i.eq(0),
+                tx_shift_q.eq(0),
                 If(sink.valid,
-                    tx_data_ia.eq(sink.ia),
-                    tx_data_qa.eq(sink.qa),
-                    tx_data_ib.eq(sink.ib),
-                    tx_data_qb.eq(sink.qb),
+                    tx_shift_i.eq(Cat(sink.ib[0:6], sink.ib[6:12], sink.ia[0:6], sink.ia[6:12])),
+                    tx_shift_q.eq(Cat(sink.qb[0:6], sink.qb[6:12], sink.qa[0:6], sink.qa[6:12])),
                 )
+            ).Else(
+                tx_shift_i.eq(Cat(Replicate(0, 6), tx_shift_i[:-6])),
+                tx_shift_q.eq(Cat(Replicate(0, 6), tx_shift_q[:-6])),
             )
         ]
         self.comb += sink.ready.eq(tx_ce)
@@ -225,10 +292,7 @@ class AD9361PHY(LiteXModule):
         self.sync.rfic += [
             If(loopback,
                 source.valid.eq(sink.valid & sink.ready),
-                source.ia.eq(sink.ia),
-                source.qa.eq(sink.qa),
-                source.ib.eq(sink.ib),
-                source.qb.eq(sink.qb),
+                source.data.eq(pack_iq(sink.ia, sink.qa, sink.ib, sink.qb)),
             )
         ]
 
@@ -236,36 +300,17 @@ class AD9361PHY(LiteXModule):
         tx_data_half_i = Signal(6)
         tx_data_half_q = Signal(6)
         self.comb += [
-            If(tx_cnt == 0,
-                tx_data_half_i.eq(tx_data_ia[6:12]),
-                tx_data_half_q.eq(tx_data_qa[6:12])
-            ).Elif(tx_cnt == 1,
-                tx_data_half_i.eq(tx_data_ia[0:6]),
-                tx_data_half_q.eq(tx_data_qa[0:6])
-            ).Elif(tx_cnt == 2,
-                tx_data_half_i.eq(tx_data_ib[6:12]),
-                tx_data_half_q.eq(tx_data_qb[6:12])
-            ).Elif(tx_cnt == 3,
-                tx_data_half_i.eq(tx_data_ib[0:6]),
-                tx_data_half_q.eq(tx_data_qb[0:6])
-            ),
-            If(mode == modes["1R1T"],
-                tx_frame.eq(tx_data_valid & ~tx_cnt[0])
-            ).Elif(mode == modes["2R2T"],
-                tx_frame.eq(tx_data_valid & (tx_cnt < 2))
-            )
+            tx_data_half_i.eq(tx_shift_i[18:24]),
+            tx_data_half_q.eq(tx_shift_q[18:24]),
+            # 1R1T: High on even tx_cnt, 2R2T: High on tx_cnt < 2.
+            tx_frame.eq(tx_data_valid & Mux(mode == Modes.M1R1T, ~tx_cnt[0], ~tx_cnt[1])),
         ]
 
         # Clocking.
         # ---------
         tx_clk_obufds = Signal()
         self.specials += [
-            Instance("ODDR",
-                p_DDR_CLK_EDGE = "SAME_EDGE",
-                i_C  = ClockSignal("rfic"),
-                i_CE = 1,
-                i_S  = 0,
-                i_R  = 0,
+            Instance("ODDR", **oddr_common,
                 i_D1 = 1,
                 i_D2 = 0,
                 o_Q  = tx_clk_obufds,
@@ -281,12 +326,7 @@ class AD9361PHY(LiteXModule):
         # --------
         tx_frame_obufds = Signal()
         self.specials += [
-            Instance("ODDR",
-                p_DDR_CLK_EDGE = "SAME_EDGE",
-                i_C  = ClockSignal("rfic"),
-                i_CE = 1,
-                i_S  = 0,
-                i_R  = 0,
+            Instance("ODDR", **oddr_common,
                 i_D1 = tx_frame,
                 i_D2 = tx_frame,
                 o_Q  = tx_frame_obufds,
@@ -301,21 +341,17 @@ class AD9361PHY(LiteXModule):
         # Data.
         # -----
         tx_data_obufds = Signal(6)
-        for i in range(6):
-            self.specials += [
-                Instance("ODDR",
-                    p_DDR_CLK_EDGE = "SAME_EDGE",
-                    i_C  = ClockSignal("rfic"),
-                    i_CE = 1,
-                    i_S  = 0,
-                    i_R  = 0,
-                    i_D1 = tx_data_half_i[i],
-                    i_D2 = tx_data_half_q[i],
-                    o_Q  = tx_data_obufds[i],
-                ),
-                Instance("OBUFDS",
-                    i_I  = tx_data_obufds[i],
-                    o_O  = pads.tx_data_p[i],
-                    o_OB = pads.tx_data_n[i]
-                ),
-            ]
+        self.specials += [
+            Instance("ODDR", **oddr_common,
+                i_D1 = tx_data_half_i[i],
+                i_D2 = tx_data_half_q[i],
+                o_Q  = tx_data_obufds[i],
+            ) for i in range(6)
+        ]
+        self.specials += [
+            Instance("OBUFDS",
+                i_I  = tx_data_obufds[i],
+                o_O  = pads.tx_data_p[i],
+                o_OB = pads.tx_data_n[i]
+            ) for i in range(6)
+        ]
@@ -7,10 +7,18 @@
 from migen import *
 
 from litex.gen import *
-from litex.gen.genlib.misc import WaitTimer
 
 from litepcie.common import *
 
+# AD9361 PRBS Helpers ------------------------------------------------------------------------------
+
+def _xor_tree(bits):
+    # Balanced XOR tree: ceil(log2(n)) levels instead of a n-1 levels chain.
+    if len(bits) == 1:
+        return bits[0]
+    half = len(bits)//2
+    return _xor_tree(bits[:half]) ^ _xor_tree(bits[half:])
+
 # AD9361 PRBS Generator ----------------------------------------------------------------------------
 
 class AD9361PRBSGenerator(LiteXModule):
@@ -21,44 +29,40 @@ class AD9361PRBSGenerator(LiteXModule):
         # # #
 
         data = Signal(16, reset=seed)
-        self.sync += If(self.ce, data.eq(Cat((
-            data[1]  ^ data[2]  ^ data[4]  ^ data[5]  ^
-            data[6]  ^ data[7]  ^ data[8]  ^ data[9]  ^
-            data[10] ^ data[11] ^ data[12] ^ data[13] ^
-            data[14] ^ data[15]),
-            data[:-1]
-            )
-        ))
+        fb   = _xor_tree([data[i] for i in [1, 2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]])
+        self.sync += If(self.ce, data.eq(Cat(fb, data[:-1])))
         self.comb += self.o.eq(data)
 
 # AD9361 PRBS Checker ----------------------------------------------------------------------------
 
 class AD9361PRBSChecker(LiteXModule):
-    def __init__(self, seed=0x0a54):
+    """PRBS Checker against a (shared) reference PRBS Generator.
+
+    The reference generator is provided by the caller so that it can be shared between multiple
+    checkers; the caller is also responsible for re-synchronizing it on `error`.
+
+    `synced` is asserted after 2**sync_bits - 1 consecutive error-free samples (use sync_bits=10
+    for the previous ~1024 cycles behaviour).
+    """
+    def __init__(self, ref, sync_bits=4):
         self.ce     = Signal(reset=1)
         self.i      = Signal(12)
+        self.error  = Signal()
         self.synced = Signal()
 
         # # #
 
-        error = Signal()
-
-        # # #
-
-        # PRBS reference
-        prbs = AD9361PRBSGenerator(seed=seed)
-        prbs = ResetInserter()(prbs)
-        self.submodules += prbs
-
-        # PRBS re-synchronization.
-        self.comb += prbs.ce.eq(self.ce)
-        self.comb += prbs.reset.eq(error)
-
         # Error generation.
-        self.comb += If(self.ce, error.eq(self.i != prbs.o[:12]))
-
-
-        # Sync generation.
-        self.sync_timer = WaitTimer(1024)
-        self.comb += self.sync_timer.wait.eq(~error)
-        self.comb += self.synced.eq(self.sync_timer.done)
+        self.comb += If(self.ce, self.error.eq(self.i != ref[:12]))
+
+        # Sync generation (Saturating counter, cleared on error).
+        sync_count = Signal(sync_bits)
+        sync_max   = 2**sync_bits - 1
+        self.sync += If(self.ce,
+            If(self.error,
+                sync_count.eq(0)
+            ).Elif(sync_count != sync_max,
+                sync_count.eq(sync_count + 1)
+            )
+        )
+        self.comb += self.synced.eq(sync_count == sync_max)
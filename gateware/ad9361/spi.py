@@ -11,6 +11,7 @@ from migen import *
 from litex.gen import *
 
 from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
 
 # AD9361 SPI Master --------------------------------------------------------------------------------
 
@@ -19,8 +20,15 @@ class AD9361SPIMaster(LiteXModule):
 
     This module implements a 4-wire SPI Master with CPOL=0 and CPHA=1. It supports configurable data
     width and SPI clk divider at build time.
+
+    With with_fifo, an optional `mosi_fifo` register allows queuing up to fifo_depth MOSI words that
+    are then transferred back-to-back (with the current `length`) without software start/polling
+    per word. Writes to `mosi_fifo` while the FIFO is full are dropped: software must not queue more
+    than fifo_depth words before checking `fifo_empty`. The `fifo_empty` status bit only indicates
+    that all queued words have been started (the last one can still be shifting out), the `idle`
+    status bit indicates that all queued words have been sent.
     """
-    def __init__(self, pads, data_width=24, clk_divider=2):
+    def __init__(self, pads, data_width=24, clk_divider=2, with_fifo=False, fifo_depth=16):
         self.pads = pads
 
         self._control = CSRStorage(fields=[
@@ -32,27 +40,71 @@ class AD9361SPIMaster(LiteXModule):
                 ("``  8``", "8-bit transfer."),
                 ("`` 16``", "16-bit transfer."),
                 ("`` 24``", "24-bit transfer."),
-            ], description="Transfer length in bits.")
+            ], description="Transfer length in bits (clamped to data_width).")
         ])
-        self._status  = CSRStatus(fields=[
+        status_fields = [
             CSRField("done", size=1, offset=0, values=[
                 ("``0b0``", "Transfer ongoing."),
                 ("``0b1``", "Transfer done."),
             ], description="Transfer status."),
-        ])
+        ]
+        if with_fifo:
+            status_fields += [
+                CSRField("fifo_empty", size=1, offset=1, values=[
+                    ("``0b0``", "MOSI FIFO words pending."),
+                    ("``0b1``", "MOSI FIFO empty."),
+                ], description="MOSI FIFO status."),
+                CSRField("idle", size=1, offset=2, values=[
+                    ("``0b0``", "Transfer ongoing or MOSI FIFO words pending."),
+                    ("``0b1``", "MOSI FIFO empty and no transfer ongoing."),
+                ], description="SPI Master idle status."),
+            ]
+        self._status  = CSRStatus(fields=status_fields)
         self._mosi = CSRStorage(data_width)
         self._miso = CSRStatus(data_width)
+        if with_fifo:
+            self._mosi_fifo = CSRStorage(data_width, description="MOSI FIFO (queued transfers).")
 
         # # #
 
         # Signals.
         # --------
-        start       = self._control.fields.start
-        length      = self._control.fields.length
+        start       = Signal()
+        mosi_data   = Signal(data_width)
+        length      = Signal(max=data_width + 1)
         done        = self._status.fields.done
         chip_select = Signal()
         shift       = Signal()
 
+        # Length (Clamped to data_width, cnt can't count further).
+        # --------------------------------------------------------
+        self.comb += length.eq(self._control.fields.length)
+        self.comb += If(self._control.fields.length > data_width, length.eq(data_width))
+
+        # Start.
+        # ------
+        self.comb += [
+            start.eq(self._control.fields.start),
+            mosi_data.eq(self._mosi.storage),
+        ]
+
+        # MOSI FIFO (Optional).
+        # ---------------------
+        if with_fifo:
+            self.fifo = fifo = stream.SyncFIFO([("data", data_width)], fifo_depth)
+            self.comb += [
+                fifo.sink.valid.eq(self._mosi_fifo.re),
+                fifo.sink.data.eq(self._mosi_fifo.storage),
+                self._status.fields.fifo_empty.eq(~fifo.source.valid),
+                self._status.fields.idle.eq(done & ~fifo.source.valid),
+                # Start next queued transfer when idle.
+                If(done & fifo.source.valid & ~self._control.fields.start,
+                    fifo.source.ready.eq(1),
+                    start.eq(1),
+                    mosi_data.eq(fifo.source.data),
+                ),
+            ]
+
         # Clk Div/Gen.
         # ------------
         clk_count = Signal(int(math.log2(clk_divider)))
@@ -75,7 +127,8 @@ class AD9361SPIMaster(LiteXModule):
 
         # FSM.
         # ----
-        cnt     = Signal(8)
+        cnt      = Signal(max=data_width + 1)
+        cnt_done = Signal() # Registered (cnt == length), computed from cnt's next value.
         self.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
             If(start,
@@ -85,15 +138,17 @@ class AD9361SPIMaster(LiteXModule):
             NextValue(cnt, 0),
         )
         fsm.act("WAIT_CLK",
+            NextValue(cnt_done, length == 0),
             If(clk_clr,
                 NextState("SHIFT")
             ),
         )
         fsm.act("SHIFT",
-            If(cnt == length,
+            If(cnt_done,
                 NextState("END")
             ).Else(
-                NextValue(cnt, cnt + clk_clr)
+                NextValue(cnt,      cnt + clk_clr),
+                NextValue(cnt_done, (cnt + clk_clr) == length),
             ),
             chip_select.eq(1),
             shift.eq(1),
@@ -118,7 +173,7 @@ class AD9361SPIMaster(LiteXModule):
         self.sync += [
             # Load MOSI at the start of the transfer.
             If(start,
-                mosi_shift_reg.eq(self._mosi.storage)
+                mosi_shift_reg.eq(mosi_data)
             # Shift MOSI.
             ).Elif(clk_clr & shift,
                 mosi_shift_reg.eq(Cat(Signal(), mosi_shift_reg[:-1]))
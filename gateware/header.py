@@ -16,8 +16,8 @@ from litex.soc.interconnect.csr import *
 # Header Inserter/Extracter ------------------------------------------------------------------------
 
 class HeaderInserterExtracter(LiteXModule):
-    def __init__(self, mode="inserter", data_width=64, with_csr=True):
-        assert data_width == 64
+    def __init__(self, mode="inserter", data_width=64, with_csr=True, fifo_depth=16):
+        assert data_width % 64 == 0
         assert mode in ["inserter", "extracter"]
         self.sink   = sink   = stream.Endpoint(dma_layout(data_width)) # i
         self.source = source = stream.Endpoint(dma_layout(data_width)) # o
@@ -28,6 +28,14 @@ class HeaderInserterExtracter(LiteXModule):
         self.header        = Signal(64) # i (Inserter) / o (Extracter)
         self.timestamp     = Signal(64) # i (Inserter) / o (Extracter)
 
+        # Header/Timestamp actually inserted/extracted in the last frame (valid on update).
+        if mode == "inserter":
+            self.last_header    = Signal(64) # o
+            self.last_timestamp = Signal(64) # o
+        else:
+            self.last_header    = self.header
+            self.last_timestamp = self.timestamp
+
         self.enable        = Signal()   # i (CSR).
         self.header_enable = Signal()   # i (CSR).
         self.frame_cycles  = Signal(32) # i (CSR).
@@ -37,9 +45,16 @@ class HeaderInserterExtracter(LiteXModule):
 
         # # #
 
+        # Sink Buffering (Decouples DMA from FSM back-pressure, 0 to disable).
+        if fifo_depth:
+            self.fifo = fifo = ResetInserter()(stream.SyncFIFO(dma_layout(data_width), fifo_depth))
+            self.comb += fifo.reset.eq(self.reset)
+            self.comb += sink.connect(fifo.sink)
+            sink = fifo.source
+
         # Signals.
         first  = Signal()
-        cycles = Signal(32)
+        cycles = Signal(32) # Remaining cycles in Frame (Down-counter, reloaded with frame_cycles - 1).
 
         # FSM.
         self.fsm = fsm = ResetInserter()(FSM(reset_state="RESET"))
@@ -53,7 +68,7 @@ class HeaderInserterExtracter(LiteXModule):
             NextState("IDLE")
         )
         fsm.act("IDLE",
-            NextValue(cycles, 0),
+            NextValue(cycles, self.frame_cycles - 1),
             If(self.header_enable,
                 NextState("HEADER")
             ).Else(
@@ -61,43 +76,74 @@ class HeaderInserterExtracter(LiteXModule):
             )
         )
         if mode == "extracter":
-            fsm.act("HEADER",
-                sink.ready.eq(1),
-                If(sink.valid & sink.ready & (sink.first | ~first),
-                    NextValue(first, 0),
-                    NextValue(self.header, sink.data[0:64]),
-                    NextState("TIMESTAMP")
+            if data_width >= 128:
+                # Header and Timestamp received in a single beat.
+                fsm.act("HEADER",
+                    sink.ready.eq(1),
+                    If(sink.valid & sink.ready & (sink.first | ~first),
+                        NextValue(first, 0),
+                        NextValue(self.header,    sink.data[ 0: 64]),
+                        NextValue(self.timestamp, sink.data[64:128]),
+                        NextValue(self.update, 1),
+                        NextState("FRAME")
+                    )
                 )
-            )
-            fsm.act("TIMESTAMP",
-                sink.ready.eq(1),
-                If(sink.valid & sink.ready,
-                    NextValue(self.timestamp, sink.data[0:64]),
-                    NextState("FRAME")
+            else:
+                fsm.act("HEADER",
+                    sink.ready.eq(1),
+                    If(sink.valid & sink.ready & (sink.first | ~first),
+                        NextValue(first, 0),
+                        NextValue(self.header, sink.data[0:64]),
+                        NextState("TIMESTAMP")
+                    )
+                )
+                fsm.act("TIMESTAMP",
+                    sink.ready.eq(1),
+                    If(sink.valid & sink.ready,
+                        NextValue(self.timestamp, sink.data[0:64]),
+                        NextValue(self.update, 1),
+                        NextState("FRAME")
+                    )
                 )
-            )
         if mode == "inserter":
-            fsm.act("HEADER",
-                source.valid.eq(1),
-                source.data[0:64].eq(self.header),
-                If(source.valid & source.ready,
-                    NextState("TIMESTAMP"),
+            if data_width >= 128:
+                # Header and Timestamp sent in a single beat.
+                fsm.act("HEADER",
+                    source.valid.eq(1),
+                    source.data[ 0: 64].eq(self.header),
+                    source.data[64:128].eq(self.timestamp),
+                    If(source.valid & source.ready,
+                        NextValue(self.last_header,    self.header),
+                        NextValue(self.last_timestamp, self.timestamp),
+                        NextValue(self.update, 1),
+                        NextState("FRAME"),
+                    )
                 )
-            )
-            fsm.act("TIMESTAMP",
-                source.valid.eq(1),
-                source.data[0:64].eq(self.timestamp),
-                If(source.valid & source.ready,
-                    NextState("FRAME"),
+            else:
+                fsm.act("HEADER",
+                    source.valid.eq(1),
+                    source.data[0:64].eq(self.header),
+                    If(source.valid & source.ready,
+                        NextValue(self.last_header, self.header),
+                        NextState("TIMESTAMP"),
+                    )
+                )
+                fsm.act("TIMESTAMP",
+                    source.valid.eq(1),
+                    source.data[0:64].eq(self.timestamp),
+                    If(source.valid & source.ready,
+                        NextValue(self.last_timestamp, self.timestamp),
+                        NextValue(self.update, 1),
+                        NextState("FRAME"),
+                    )
                 )
-            )
         fsm.act("FRAME",
             sink.connect(source),
             NextValue(self.update, 0),
             If(self.header_enable & source.valid & source.ready,
-                NextValue(cycles, cycles + 1),
-                If(cycles == (self.frame_cycles - 1),
-                    NextValue(cycles, 0),
+                NextValue(cycles, cycles - 1),
+                If(cycles == 0,
+                    NextValue(cycles, self.frame_cycles - 1),
                     NextState("HEADER")
                 )
             )
@@ -114,7 +160,7 @@ class HeaderInserterExtracter(LiteXModule):
                 ("``0b1``", "Header Inserter/Extracter Disabled."),
             ], reset=default_header_enable),
         ])
-        self._frame_cycles = CSRStorage(32, description="Frame Cycles (64-bit word)", reset=int(default_frame_cycles))
+        self._frame_cycles = CSRStorage(32, description="Frame Cycles (in data_width words)", reset=int(default_frame_cycles))
 
         # # #
 
@@ -125,32 +171,34 @@ class HeaderInserterExtracter(LiteXModule):
 # TX Header Extracter ------------------------------------------------------------------------------
 
 class TXHeaderExtracter(HeaderInserterExtracter):
-    def __init__(self, data_width=128, with_csr=True):
+    def __init__(self, data_width=128, with_csr=True, fifo_depth=16):
         HeaderInserterExtracter.__init__(self,
             mode       = "extracter",
             data_width = data_width,
             with_csr   = with_csr,
+            fifo_depth = fifo_depth,
         )
 
 # RX Header Inserter -------------------------------------------------------------------------------
 
 class RXHeaderInserter(HeaderInserterExtracter):
-    def __init__(self, data_width=128, with_csr=True):
+    def __init__(self, data_width=128, with_csr=True, fifo_depth=16):
         HeaderInserterExtracter.__init__(self,
             mode       = "inserter",
             data_width = data_width,
             with_csr   = with_csr,
+            fifo_depth = fifo_depth,
         )
 
 # TX/RX Header -------------------------------------------------------------------------------------
 
 class TXRXHeader(LiteXModule):
-    def __init__(self, data_width, with_csr=True):
+    def __init__(self, data_width, with_csr=True, fifo_depth=16):
         # TX.
-        self.tx = TXHeaderExtracter(data_width, with_csr)
+        self.tx = TXHeaderExtracter(data_width, with_csr, fifo_depth)
 
         # RX.
-        self.rx = RXHeaderInserter(data_width, with_csr)
+        self.rx = RXHeaderInserter(data_width, with_csr, fifo_depth)
 
         # CSR.
         if with_csr:
@@ -158,24 +206,22 @@ class TXRXHeader(LiteXModule):
             self.last_tx_timestamp = CSRStatus(64, description="Last TX Timestamp.")
             self.last_rx_header    = CSRStatus(64, description="Last RX Header.")
             self.last_rx_timestamp = CSRStatus(64, description="Last RX Timestamp.")
-            self.sync += [
-                # Reset.
-                If(self.tx.reset,
-                    self.last_tx_header.status.eq(0),
-                    self.last_tx_timestamp.status.eq(0),
-                ),
-                If(self.rx.reset,
-                    self.last_rx_header.status.eq(0),
-                    self.last_rx_timestamp.status.eq(0),
-                ),
-                # TX Update.
-                If(self.tx.update,
-                    self.last_tx_header.status.eq(self.tx.header),
-                    self.last_tx_timestamp.status.eq(self.tx.timestamp),
-                ),
-                # RX Update.
-                If(self.rx.update,
-                    self.last_rx_header.status.eq(self.rx.header),
-                    self.last_rx_timestamp.status.eq(self.rx.timestamp),
-                )
-            ]
+            # Reset/Update merged in a single Case per direction. The reset is synchronous and update
+            # can still be set on the first reset cycle: update then has priority (0b11).
+            for module, last_header, last_timestamp in [
+                (self.tx, self.last_tx_header, self.last_tx_timestamp),
+                (self.rx, self.last_rx_header, self.last_rx_timestamp),
+            ]:
+                update = [
+                    last_header.status.eq(module.last_header),
+                    last_timestamp.status.eq(module.last_timestamp),
+                ]
+                reset = [
+                    last_header.status.eq(0),
+                    last_timestamp.status.eq(0),
+                ]
+                self.sync += Case(Cat(module.update, module.reset), {
+                    0b01 : update,
+                    0b10 : reset,
+                    0b11 : update,
+                })
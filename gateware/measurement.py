@@ -4,44 +4,97 @@
 # Copyright (c) 2024 Enjoy-Digital <enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+from functools import reduce
+from operator import xor
+
 from migen import *
-from migen.genlib.cdc       import PulseSynchronizer, MultiReg
+from migen.genlib.cdc       import MultiReg
 from migen.genlib.resetsync import AsyncResetSynchronizer
 
 from litex.gen import *
 
 from litex.soc.interconnect.csr import *
 
+# Helpers ------------------------------------------------------------------------------------------
+
+def _gray_decode(gray):
+    # Binary bit i is the XOR of Gray bits i and above.
+    return Cat(*[reduce(xor, [gray[j] for j in range(i, len(gray))]) for i in range(len(gray))])
+
 # Clk Measurement ----------------------------------------------------------------------------------
 
 class ClkMeasurement(LiteXModule):
-    def __init__(self, clk, increment=1):
-        self.latch = CSR()
-        self.value = CSRStatus(64)
+    def __init__(self, clk, width=32, with_csr=True):
+        assert 16 <= width <= 64 # Counter must not advance by 2**(width-2) between two sys cycles.
+        self.latch       = CSR() if with_csr else Signal()
+        self.latch_value = Signal(64) # o (sys).
+        if with_csr:
+            self.value = CSRStatus(64)
 
         # # #
 
+        # Unconnected/Constant Clock: Nothing to measure, latch_value/value stay at 0.
+        if clk is None or isinstance(clk, int):
+            return
+
         # Create Clock Domain.
         self.cd_counter = ClockDomain()
         self.comb += self.cd_counter.clk.eq(clk)
         self.specials += AsyncResetSynchronizer(self.cd_counter, ResetSignal())
 
-        # Free-running Clock Counter.
-        counter = Signal(64)
-        self.sync.counter += counter.eq(counter + increment)
+        # Free-running Clock Counter (+ Gray-coded copy, only 1 bit changes per increment).
+        counter      = Signal(width)
+        counter_next = Signal(width)
+        counter_gray = Signal(width)
+        self.comb += counter_next.eq(counter + 1)
+        self.sync.counter += [
+            counter.eq(counter_next),
+            counter_gray.eq(counter_next ^ (counter_next >> 1)),
+        ]
+
+        # Resynchronize/Decode Gray-coded Clock Counter (counter -> sys).
+        counter_gray_sys = Signal(width)
+        counter_sys      = Signal(width)
+        self.specials += MultiReg(counter_gray, counter_gray_sys)
+        self.comb += counter_sys.eq(_gray_decode(counter_gray_sys))
 
-        # Latch Clock Counter.
-        latch_value = Signal(64)
-        latch_sync  = PulseSynchronizer("sys", "counter")
-        self.submodules += latch_sync
-        self.comb += latch_sync.i.eq(self.latch.re)
-        self.sync.counter += If(latch_sync.o, latch_value.eq(counter))
-        self.specials += MultiReg(latch_value, self.value.status)
+        # Extend Clock Counter to 64-bit in sys. A wrap is only counted on a large backward step (2
+        # MSBs going from 0b11 to 0b00), so a single bad sample can't shift the upper part. This
+        # requires the counter to advance by less than 2**(width-2) between two sys cycles.
+        counter_ext = Signal(64)
+        counter_msbs_prev = counter_ext[width-2:width]
+        counter_msbs      = counter_sys[width-2:width]
+        self.sync += counter_ext[:width].eq(counter_sys)
+        if width < 64:
+            self.sync += If((counter_msbs_prev == 0b11) & (counter_msbs == 0b00),
+                counter_ext[width:].eq(counter_ext[width:] + 1)
+            )
+
+        # Latch Clock Counter (directly in sys).
+        self.sync += If(self.latch.re if with_csr else self.latch,
+            self.latch_value.eq(counter_ext)
+        )
+        if with_csr:
+            self.comb += self.value.status.eq(self.latch_value)
 
 # Multi Clk Measurement ----------------------------------------------------------------------------
 
 class MultiClkMeasurement(LiteXModule):
     def __init__(self, clks):
         assert isinstance(clks, dict)
+        self.latch  = CSR()
+        self.select = CSRStorage(bits_for(len(clks) - 1), description="Clk selection for value readout.")
+        self.value  = CSRStatus(64)
+
+        # # #
+
+        # Clk Measurements (Latched on the same sys cycle from a single CSR write).
+        latch_values = []
         for name, clk in clks.items():
-            self.add_module(name=name, module=ClkMeasurement(clk))
+            clk_measurement = ClkMeasurement(clk, with_csr=False)
+            self.add_module(name=name, module=clk_measurement)
+            self.comb += clk_measurement.latch.eq(self.latch.re)
+            latch_values.append(clk_measurement.latch_value)
+
+        # Selected Clk Measurement Readout.
+        self.comb += self.value.status.eq(Array(latch_values)[self.select.storage])
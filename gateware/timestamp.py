@@ -13,12 +13,15 @@ from litepcie.common import *
 
 from litex.soc.interconnect.csr import *
 
+from gateware.measurement import _gray_decode
+
 # Timestamp ----------------------------------------------------------------------------------------
 
 class Timestamp(LiteXModule):
     def __init__(self, clk_domain, with_csr=True):
-        self.time = time = Signal(64) # o
-        self.pps  = pps  = Signal()   # i
+        self.time     = time = Signal(64) # o
+        self.time_sys = Signal(64)        # o (sys).
+        self.pps      = pps  = Signal()   # i
 
         self.enable    = Signal()   # i
         self.set       = Signal()   # i
@@ -33,9 +36,11 @@ class Timestamp(LiteXModule):
             self.cd_time.rst.eq(ResetSignal(clk_domain)),
         ]
 
-        # Internal 32-bit counters.
-        time_low  = Signal(32)
-        time_high = Signal(32)
+        # Internal 32-bit counters (The rfic domain can run at 491.52MHz with oversampling: avoid a
+        # 64-bit carry chain, the low to high carry is pre-computed and registered).
+        time_low   = Signal(32)
+        time_high  = Signal(32)
+        time_carry = Signal()
 
         # Time Handling.
         self.sync.time += [
@@ -43,13 +48,13 @@ class Timestamp(LiteXModule):
             If(~self.enable,
                 time_low.eq(0),
                 time_high.eq(0),
+                time_carry.eq(0),
             # Increment.
             ).Else(
-                If(time_low == 0xffffffff,
-                    time_low.eq(0),
+                time_low.eq(time_low + 1),
+                time_carry.eq(time_low == (2**32 - 2)),
+                If(time_carry,
                     time_high.eq(time_high + 1)
-                ).Else(
-                    time_low.eq(time_low + 1)
                 )
             )
         ]
@@ -57,6 +62,13 @@ class Timestamp(LiteXModule):
         # Combine low and high counters into 64-bit time signal.
         self.comb += time.eq(Cat(time_low, time_high))
 
+        # Time Resync to sys (Gray-coded, only 1 bit changes per increment).
+        time_gray     = Signal(64)
+        time_gray_sys = Signal(64)
+        self.sync.time += time_gray.eq(time ^ (time >> 1))
+        self.specials += MultiReg(time_gray, time_gray_sys)
+        self.sync += self.time_sys.eq(_gray_decode(time_gray_sys))
+
         # PPS Resync/Edge.
         _pps      = Signal()
         _pps_d    = Signal()
@@ -77,6 +89,7 @@ class Timestamp(LiteXModule):
                 _set.eq(1),
                 time_low.eq(self.set_time[:32]),
                 time_high.eq(self.set_time[32:]),
+                time_carry.eq(self.set_time[:32] == (2**32 - 1)),
                 If(_pps_edge,
                     _set.eq(0)
                 ),
@@ -50,7 +50,7 @@ from gateware.header      import TXRXHeader
 from gateware.measurement import MultiClkMeasurement
 
 from software import generate_litepcie_software
-from software import get_pcie_device_id, remove_pcie_device, rescan_pcie_bus
+from software import get_pcie_device_ids, remove_pcie_devices, rescan_pcie_bus
 
 # CRG ----------------------------------------------------------------------------------------------
 
@@ -132,6 +132,8 @@ class BaseSoC(SoCMini):
         with_sata     = False, sata_gen="gen2",
         with_jtagbone = True,
         with_rfic_oversampling = True,
+        with_rfic_idelay       = False,
+        ident_version = True,
     ):
         # Platform ---------------------------------------------------------------------------------
 
@@ -145,7 +147,7 @@ class BaseSoC(SoCMini):
 
         SoCMini.__init__(self, platform, sys_clk_freq,
             ident         = f"LiteX SoC on LiteX-M2SDR",
-            ident_version = True,
+            ident_version = ident_version,
         )
 
         # Clocking ---------------------------------------------------------------------------------
@@ -206,6 +208,10 @@ class BaseSoC(SoCMini):
         self.dna = DNA()
         self.dna.add_timing_constraints(platform, sys_clk_freq, self.crg.cd_sys.clk)
 
+        # ICAP/XADC/DNA Placement (Single/Fixed sites, locked up front).
+        for cell, site in [("ICAPE2", "ICAP_X0Y0"), ("XADC", "XADC_X0Y0"), ("DNA_PORT", "DNA_PORT_X0Y0")]:
+            platform.toolchain.pre_placement_commands.append(f"set_property LOC {site} [get_cells -hierarchical -filter {{{{REF_NAME == {cell}}}}}]")
+
         # SPI Flash --------------------------------------------------------------------------------
         self.flash_cs_n = GPIOOut(platform.request("flash_cs_n"))
         self.flash      = S7SPIFlash(platform.request("flash"), sys_clk_freq, 25e6)
@@ -242,10 +248,9 @@ class BaseSoC(SoCMini):
             self.comb += self.pcie_dma0.synchronizer.pps.eq(1)
 
             # Timing Constraints/False Paths -------------------------------------------------------
-            for i in range(4):
-                platform.toolchain.pre_placement_commands.append(f"set_clock_groups -group [get_clocks {{{{*s7pciephy_clkout{i}}}}}] -group [get_clocks   dna_clk] -asynchronous")
-                platform.toolchain.pre_placement_commands.append(f"set_clock_groups -group [get_clocks {{{{*s7pciephy_clkout{i}}}}}] -group [get_clocks  jtag_clk] -asynchronous")
-                platform.toolchain.pre_placement_commands.append(f"set_clock_groups -group [get_clocks {{{{*s7pciephy_clkout{i}}}}}] -group [get_clocks  icap_clk] -asynchronous")
+            pcie_clks = " ".join(f"*s7pciephy_clkout{i}" for i in range(4))
+            for clk in ["dna_clk", "jtag_clk", "icap_clk"]:
+                platform.toolchain.pre_placement_commands.append(f"set_clock_groups -group [get_clocks {{{{{pcie_clks}}}}}] -group [get_clocks {clk}] -asynchronous")
 
         # Ethernet ---------------------------------------------------------------------------------
 
@@ -301,7 +306,7 @@ class BaseSoC(SoCMini):
         self.header = TXRXHeader(data_width=64)
         self.comb += [
             self.header.rx.header.eq(0x5aa5_5aa5_5aa5_5aa5), # Unused for now, arbitrary.
-            self.header.rx.timestamp.eq(self.timestamp.time),
+            self.header.rx.timestamp.eq(self.timestamp.time_sys),
         ]
         if with_pcie:
             # PCIe TX -> Header TX.
@@ -322,6 +327,7 @@ class BaseSoC(SoCMini):
             rfic_pads    = platform.request("ad9361_rfic"),
             spi_pads     = platform.request("ad9361_spi"),
             sys_clk_freq = sys_clk_freq,
+            with_idelay  = with_rfic_idelay,
         )
         self.ad9361.add_prbs()
         if with_pcie:
@@ -347,6 +353,19 @@ class BaseSoC(SoCMini):
             "clk3" : ClockSignal("rfic"),
         })
 
+        # Gray-coded CDCs Timing Constraints -------------------------------------------------------
+
+        # Gray-coded counters (Clk Measurements, Timestamp) are resynchronized to sys with MultiRegs
+        # (false paths): bound the skew between bits to the fastest source clock period (rfic) so
+        # that a sampled code is always a valid one.
+        for name in ["counter_gray", "time_gray"]:
+            platform.toolchain.pre_placement_commands.append(
+                f"set_bus_skew "
+                f"-from [get_cells -hierarchical -filter {{{{NAME =~ *{name}_reg*}}}}] "
+                f"-to [all_fanout -from [get_pins -hierarchical -filter {{{{NAME =~ *{name}_reg*/Q}}}}] -flat -endpoints_only -only_cells] "
+                f"{1e9/rfic_clk_freq:.3f}"
+            )
+
     # LiteScope Probes (Debug) ---------------------------------------------------------------------
 
     def add_ad9361_spi_probe(self):
@@ -362,7 +381,7 @@ class BaseSoC(SoCMini):
         analyzer_signals = [
             self.ad9361.phy.sink,   # TX.
             self.ad9361.phy.source, # RX.
-            self.ad9361.prbs_rx.fields.synced,
+            self.ad9361.prbs_synced,
         ]
         self.analyzer = LiteScopeAnalyzer(analyzer_signals,
             depth        = 4096,
@@ -397,6 +416,7 @@ def main():
     parser.add_argument("--flash-multiboot", action="store_true", help="Flash multiboot bitstreams.")
     parser.add_argument("--rescan",          action="store_true", help="Execute PCIe Rescan while Loading/Flashing.")
     parser.add_argument("--driver",          action="store_true", help="Generate PCIe driver from LitePCIe (override local version).")
+    parser.add_argument("--no-ident-version", action="store_true", help="Do not add build date/time to SoC identifier (reproducible builds).")
 
     # Communication interfaces/features.
     parser.add_argument("--with-pcie",       action="store_true", help="Enable PCIe Communication.")
@@ -406,6 +426,9 @@ def main():
     parser.add_argument("--eth-sfp",         default=0, type=int, help="Ethernet SFP.", choices=[0, 1])
     parser.add_argument("--eth-phy",         default="1000basex", help="Ethernet PHY.", choices=["1000basex", "2500basex"])
 
+    # RFIC.
+    parser.add_argument("--with-rfic-idelay", action="store_true", help="Enable RFIC RX IDELAYs (FPGA-side RX timing training).")
+
     # Litescope Probes.
     probeopts = parser.add_mutually_exclusive_group()
     probeopts.add_argument("--with-ad9361-spi-probe",  action="store_true", help="Enable AD9361 SPI Probe.")
@@ -416,13 +439,15 @@ def main():
 
     # Build SoC.
     soc = BaseSoC(
-        variant    = args.variant,
-        with_pcie  = args.with_pcie,
-        pcie_lanes = args.pcie_lanes,
-        with_eth   = args.with_eth,
-        eth_sfp    = args.eth_sfp,
-        eth_phy    = args.eth_phy,
-        with_sata  = args.with_sata,
+        variant          = args.variant,
+        with_pcie        = args.with_pcie,
+        pcie_lanes       = args.pcie_lanes,
+        with_eth         = args.with_eth,
+        eth_sfp          = args.eth_sfp,
+        eth_phy          = args.eth_phy,
+        with_sata        = args.with_sata,
+        with_rfic_idelay = args.with_rfic_idelay,
+        ident_version    = not args.no_ident_version,
     )
     if args.with_ad9361_spi_probe:
         soc.add_ad9361_spi_probe()
@@ -439,14 +464,12 @@ def main():
 
     # Remove PCIe Driver/Device.
     if (args.load or args.flash) and args.rescan:
-        device_ids = [
-            get_pcie_device_id("0x10ee", "0x7021"),
-            get_pcie_device_id("0x10ee", "0x7022"),
-            get_pcie_device_id("0x10ee", "0x7024"),
-        ]
-        for device_id in device_ids:
-            if device_id:
-                remove_pcie_device(device_id, driver="litepcie")
+        device_ids = get_pcie_device_ids([
+            ("0x10ee", "0x7021"),
+            ("0x10ee", "0x7022"),
+            ("0x10ee", "0x7024"),
+        ])
+        remove_pcie_devices(device_ids.values(), driver="litepcie")
 
     # Load Bistream.
     if args.load:
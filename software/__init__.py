@@ -18,11 +18,74 @@ def get_pcie_device_id(vendor, device):
     except:
         return None
 
+def get_pcie_device_ids(matchers, sysfs_path="/sys/bus/pci/devices"):
+    # Single sysfs scan: read vendor/device of each PCIe device once and match against all
+    # (vendor, device) pairs. Returns a dict keyed by matcher, None when not present.
+    device_ids = {matcher: None for matcher in matchers}
+    ids        = {(int(vendor, 16), int(device, 16)): (vendor, device) for vendor, device in matchers}
+    try:
+        entries = os.scandir(sysfs_path)
+    except OSError:
+        return device_ids
+    with entries:
+        for entry in entries:
+            try:
+                with open(os.path.join(entry.path, "vendor")) as f:
+                    vendor = int(f.read(6), 16)
+                with open(os.path.join(entry.path, "device")) as f:
+                    device = int(f.read(6), 16)
+            except (OSError, ValueError):
+                continue
+            matcher = ids.get((vendor, device))
+            if (matcher is not None) and (device_ids[matcher] is None):
+                # Keep lspci's format (domain 0000 omitted).
+                device_id = entry.name
+                if device_id.startswith("0000:"):
+                    device_id = device_id[5:]
+                device_ids[matcher] = device_id
+    return device_ids
+
 def remove_pcie_device(device_id, driver="litepcie"):
     if not device_id:
         return
     subprocess.run(f"echo 1 | sudo tee /sys/bus/pci/devices/0000:{device_id}/remove > /dev/null", shell=True)
 
+def _open_remove(device_id):
+    return os.open(f"/sys/bus/pci/devices/0000:{device_id}/remove", os.O_WRONLY)
+
+def _trigger_remove(fd):
+    try:
+        os.write(fd, b"1")
+    finally:
+        os.close(fd)
+
+def remove_pcie_devices(device_ids, driver="litepcie"):
+    device_ids = [device_id for device_id in device_ids if device_id]
+    # Open all remove files first, then trigger them back-to-back.
+    fds = []
+    try:
+        for device_id in device_ids:
+            fds.append(_open_remove(device_id))
+    except PermissionError:
+        # Unprivileged: fall back to sudo, one device at a time.
+        for fd in fds:
+            os.close(fd)
+        for device_id in device_ids:
+            remove_pcie_device(device_id, driver=driver)
+        return
+    for fd in fds:
+        _trigger_remove(fd)
+
+def pcie_device_responds(device_id):
+    # Read the Vendor ID from config space (and not the cached sysfs attribute): reads return
+    # all-ones while the device does not respond (link down, FPGA reconfiguring).
+    try:
+        with open(f"/sys/bus/pci/devices/0000:{device_id}/config", "rb") as f:
+            vendor = int.from_bytes(f.read(2), "little")
+    except OSError:
+        return False
+    return vendor != 0xffff
+
 def rescan_pcie_bus():
     subprocess.run("echo 1 | sudo tee /sys/bus/pci/rescan > /dev/null", shell=True)
 
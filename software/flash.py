@@ -5,25 +5,76 @@ import time
 import argparse
 import subprocess
 
-from __init__ import get_pcie_device_id, remove_pcie_device, rescan_pcie_bus
+from pathlib    import Path
+from contextlib import contextmanager
+
+from __init__ import get_pcie_device_ids, pcie_device_responds, remove_pcie_devices, rescan_pcie_bus
+
+# Paths --------------------------------------------------------------------------------------------
+
+software_dir = Path(__file__).resolve().parent
+user_dir     = software_dir / "user"
+kernel_dir   = software_dir / "kernel"
+m2sdr_util   = user_dir / "m2sdr_util"
+
+# PCIe Devices -------------------------------------------------------------------------------------
+
+pcie_devices = [
+    ("0x10ee", "0x7021"),
+    ("0x10ee", "0x7022"),
+    ("0x10ee", "0x7024"),
+]
 
 # Flash Utilities ----------------------------------------------------------------------------------
 
-def flash_bitstream(bitstream, offset):
+def flash_bitstream(bitstream, offset, device_ids, reload_timeout=2.0):
     print("Flashing Board over PCIe...")
-    subprocess.run(f"cd user && ./m2sdr_util flash_write ../{bitstream} {offset}", shell=True)
-    subprocess.run("cd user && ./m2sdr_util flash_reload", shell=True)
-    time.sleep(1)
+    if not m2sdr_util.is_file():
+        raise FileNotFoundError(f"{m2sdr_util} not found, please build user software first.")
+    bitstream = Path(bitstream).resolve()
+    subprocess.run([str(m2sdr_util), "flash_write", str(bitstream), f"0x{offset:x}"], cwd=user_dir, check=True)
+    subprocess.run([str(m2sdr_util), "flash_reload"], cwd=user_dir, check=True)
+    wait_reload(device_ids, reload_timeout)
+
+def wait_reload(device_ids, timeout, poll_period=20e-3):
+    # Poll the board's config space: wait for it to stop responding (FPGA reloading) and to respond
+    # again, instead of sleeping for a fixed time. Bounded by timeout.
+    device_ids = [device_id for device_id in device_ids if device_id]
+    deadline   = time.monotonic() + timeout
+    reloading  = False
+    while time.monotonic() < deadline:
+        if not all(pcie_device_responds(device_id) for device_id in device_ids):
+            reloading = True
+        elif reloading:
+            return
+        time.sleep(poll_period)
 
 def remove_driver():
     print("Removing Driver...")
-    subprocess.run("sudo rmmod litepcie", shell=True)
+    subprocess.run(["sudo", "rmmod", "litepcie"])
 
 def remove_board_from_pcie_bus(device_ids):
     print("Removing Board from PCIe Bus...")
-    for device_id in device_ids:
-        if device_id:
-            remove_pcie_device(device_id)
+    remove_pcie_devices(device_ids)
+
+@contextmanager
+def pcie_hotplug_tuning(cpu=0, niceness=-5):
+    # Pin to a single CPU and raise priority during PCIe removal/rescan to make its timing
+    # deterministic. Raising priority requires CAP_SYS_NICE: skipped when unprivileged.
+    try:
+        affinity = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {cpu})
+    except (AttributeError, OSError):
+        affinity = None
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+    try:
+        yield
+    finally:
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
 
 def rescan_bus():
     print("Rescanning PCIe Bus...")
@@ -31,14 +82,11 @@ def rescan_bus():
 
 def load_driver():
     print("Loading Driver...")
-    subprocess.run("sudo sh -c 'cd kernel && ./init.sh'", shell=True)
+    subprocess.run(["sudo", "./init.sh"], cwd=kernel_dir, check=True)
 
 def get_device_ids():
-    return [
-        get_pcie_device_id("0x10ee", "0x7021"),
-        get_pcie_device_id("0x10ee", "0x7022"),
-        get_pcie_device_id("0x10ee", "0x7024"),
-    ]
+    device_ids = get_pcie_device_ids(pcie_devices)
+    return [device_ids[pcie_device] for pcie_device in pcie_devices]
 
 # Main ----------------------------------------------------------------------------------------------
 
@@ -46,16 +94,18 @@ def main():
     parser = argparse.ArgumentParser(description="FPGA flashing over PCIe.")
     parser.add_argument('bitstream', help='Path to the bitstream file')
     parser.add_argument('-o', '--offset', type=lambda x: int(x, 0), default=0x00000000, help='Offset for flashing (default: 0x00000000)')
+    parser.add_argument('--reload-timeout', type=float, default=2.0, help='Max time to wait for FPGA reload in seconds (default: 2.0)')
     args = parser.parse_args()
 
     # Flash.
-    flash_bitstream(args.bitstream, args.offset)
+    device_ids = get_device_ids()
+    flash_bitstream(args.bitstream, args.offset, device_ids, args.reload_timeout)
 
     # PCIe Rescan and driver Remove/Reload.
     remove_driver()
-    device_ids = get_device_ids()
-    remove_board_from_pcie_bus(device_ids)
-    rescan_bus()
+    with pcie_hotplug_tuning():
+        remove_board_from_pcie_bus(device_ids)
+        rescan_bus()
     load_driver()
 
 if __name__ == '__main__':
@@ -402,22 +402,12 @@
 
 /* CLK_MEASUREMENT Registers */
 #define CSR_CLK_MEASUREMENT_BASE 0xf000L
-#define CSR_CLK_MEASUREMENT_CLK0_LATCH_ADDR 0xf000L
-#define CSR_CLK_MEASUREMENT_CLK0_LATCH_SIZE 1
-#define CSR_CLK_MEASUREMENT_CLK0_VALUE_ADDR 0xf004L
-#define CSR_CLK_MEASUREMENT_CLK0_VALUE_SIZE 2
-#define CSR_CLK_MEASUREMENT_CLK1_LATCH_ADDR 0xf00cL
-#define CSR_CLK_MEASUREMENT_CLK1_LATCH_SIZE 1
-#define CSR_CLK_MEASUREMENT_CLK1_VALUE_ADDR 0xf010L
-#define CSR_CLK_MEASUREMENT_CLK1_VALUE_SIZE 2
-#define CSR_CLK_MEASUREMENT_CLK2_LATCH_ADDR 0xf018L
-#define CSR_CLK_MEASUREMENT_CLK2_LATCH_SIZE 1
-#define CSR_CLK_MEASUREMENT_CLK2_VALUE_ADDR 0xf01cL
-#define CSR_CLK_MEASUREMENT_CLK2_VALUE_SIZE 2
-#define CSR_CLK_MEASUREMENT_CLK3_LATCH_ADDR 0xf024L
-#define CSR_CLK_MEASUREMENT_CLK3_LATCH_SIZE 1
-#define CSR_CLK_MEASUREMENT_CLK3_VALUE_ADDR 0xf028L
-#define CSR_CLK_MEASUREMENT_CLK3_VALUE_SIZE 2
+#define CSR_CLK_MEASUREMENT_LATCH_ADDR 0xf000L
+#define CSR_CLK_MEASUREMENT_LATCH_SIZE 1
+#define CSR_CLK_MEASUREMENT_SELECT_ADDR 0xf004L
+#define CSR_CLK_MEASUREMENT_SELECT_SIZE 1
+#define CSR_CLK_MEASUREMENT_VALUE_ADDR 0xf008L
+#define CSR_CLK_MEASUREMENT_VALUE_SIZE 2
 
 /* CLK_MEASUREMENT Fields */
 
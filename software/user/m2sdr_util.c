@@ -565,22 +565,6 @@ end:
 
 #define N_CLKS 4
 
-static const uint32_t latch_addrs[N_CLKS] =
-{
-    CSR_CLK_MEASUREMENT_CLK0_LATCH_ADDR,
-    CSR_CLK_MEASUREMENT_CLK1_LATCH_ADDR,
-    CSR_CLK_MEASUREMENT_CLK2_LATCH_ADDR,
-    CSR_CLK_MEASUREMENT_CLK3_LATCH_ADDR
-};
-
-static const uint32_t value_addrs[N_CLKS] =
-{
-    CSR_CLK_MEASUREMENT_CLK0_VALUE_ADDR,
-    CSR_CLK_MEASUREMENT_CLK1_VALUE_ADDR,
-    CSR_CLK_MEASUREMENT_CLK2_VALUE_ADDR,
-    CSR_CLK_MEASUREMENT_CLK3_VALUE_ADDR
-};
-
 static const char* clk_names[N_CLKS] = {
     "       Sys Clk",
     "      PCIe Clk",
@@ -597,15 +581,19 @@ static uint64_t read_64bit_register(int fd, uint32_t addr)
 
 static void latch_all_clocks(int fd)
 {
-    for (int i = 0; i < N_CLKS; i++) {
-        litepcie_writel(fd, latch_addrs[i], 1);
-    }
+    litepcie_writel(fd, CSR_CLK_MEASUREMENT_LATCH_ADDR, 1);
+}
+
+static uint64_t read_clock(int fd, int clk_index)
+{
+    litepcie_writel(fd, CSR_CLK_MEASUREMENT_SELECT_ADDR, clk_index);
+    return read_64bit_register(fd, CSR_CLK_MEASUREMENT_VALUE_ADDR);
 }
 
 static void read_all_clocks(int fd, uint64_t *values)
 {
     for (int i = 0; i < N_CLKS; i++) {
-        values[i] = read_64bit_register(fd, value_addrs[i]);
+        values[i] = read_clock(fd, i);
     }
 }
 
@@ -684,13 +672,13 @@ static void vcxo_test() {
         litepcie_writel(fd, CSR_SI5351_PWM_WIDTH_ADDR, pwm_width);
 
         latch_all_clocks(fd);
-        previous_value = read_64bit_register(fd, CSR_CLK_MEASUREMENT_CLK0_VALUE_ADDR);
+        previous_value = read_clock(fd, 0);
         clock_gettime(CLOCK_MONOTONIC, &start_time);
 
         sleep(1);
 
         latch_all_clocks(fd);
-        current_value = read_64bit_register(fd, CSR_CLK_MEASUREMENT_CLK0_VALUE_ADDR);
+        current_value = read_clock(fd, 0);
         clock_gettime(CLOCK_MONOTONIC, &current_time);
 
         elapsed_time = (current_time.tv_sec - start_time.tv_sec) +
@@ -13,18 +13,13 @@ bus = RemoteClient()
 bus.open()
 
 def latch_all():
-    bus.regs.clk_measurement_clk0_latch.write(1)
-    bus.regs.clk_measurement_clk1_latch.write(1)
-    bus.regs.clk_measurement_clk2_latch.write(1)
-    bus.regs.clk_measurement_clk3_latch.write(1)
+    bus.regs.clk_measurement_latch.write(1)
 
 def read_all():
-    values = [
-        bus.regs.clk_measurement_clk0_value.read(),
-        bus.regs.clk_measurement_clk1_value.read(),
-        bus.regs.clk_measurement_clk2_value.read(),
-        bus.regs.clk_measurement_clk3_value.read()
-    ]
+    values = []
+    for clk_index in range(4):
+        bus.regs.clk_measurement_select.write(clk_index)
+        values.append(bus.regs.clk_measurement_value.read())
     return values
 
 num_measurements    = 10